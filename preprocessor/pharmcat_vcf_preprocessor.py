@@ -88,8 +88,11 @@ if __name__ == "__main__":
 
     try:
         # make sure we have required tools
-        m_bcftools_path = preprocessor.validate_bcftools(args.path_to_bcftools)
-        m_bgzip_path = preprocessor.validate_bgzip(args.path_to_bgzip)
+        # (bgzip is only needed for plain-text inputs, so it is validated lazily on first use
+        # unless a specific binary was requested)
+        preprocessor.validate_bcftools(args.path_to_bcftools)
+        if args.path_to_bgzip:
+            preprocessor.validate_bgzip(args.path_to_bgzip)
 
         script_dir: Path = Path(globals().get("__file__", "./_")).absolute().parent
 
@@ -98,17 +98,17 @@ def _preprocess(pharmcat_positions_vcf: Path, reference_genome: Path,
                                                     concurrent_mode=concurrent_mode, max_processes=max_processes,
                                                     verbose=verbose)
     # normalize the input VCF
-    normalized_vcf = util.normalize_vcf(reference_genome, pgx_region_vcf, output_dir, output_basename, verbose=verbose)
+    normalized_vcf = util.normalize_vcf(reference_genome, pgx_region_vcf, output_dir, output_basename,
+                                        max_processes=max_processes, verbose=verbose)
 
     # extract the specific PGx genetic variants in the reference PGx VCF
     # this step also generates a report of missing PGx positions in the input VCF
     pgx_variants_vcf: Path = util.extract_pgx_variants(pharmcat_positions_vcf, reference_genome, normalized_vcf,
                                                        output_dir, output_basename, missing_to_ref=missing_to_ref,
-                                                       verbose=verbose)
+                                                       max_processes=max_processes, verbose=verbose)
 
     if not keep_intermediate_files:
-        util.delete_vcf_and_index(pgx_region_vcf, verbose=verbose)
-        util.delete_vcf_and_index(normalized_vcf, verbose=verbose)
+        util.delete_vcfs_and_indexes([pgx_region_vcf, normalized_vcf], verbose=verbose)
 
     return pgx_variants_vcf
 
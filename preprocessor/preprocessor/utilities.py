@@ -4,6 +4,7 @@ __author__ = 'BinglanLi'
 import concurrent.futures
 import copy
 import gzip
+import json
 import os
 import re
 import shutil
@@ -22,6 +23,12 @@ import allel
 import pandas as pd
 from packaging import version
 
+try:
+    # optional dependency - used for fast, in-process VCF header parsing when available
+    from cyvcf2 import VCF as _CyVCF
+except ImportError:
+    _CyVCF = None
+
 from . import common
 from .exceptions import ReportableException, InappropriateVCFSuffix, InvalidURL
 
@@ -42,6 +49,20 @@ _chr_valid_length = ["248956422", "242193529", "198295559", "190214555", "181538
                      "46709983", "50818468", "156040895", "57227415", "16569"]
 _missing_pgx_var_suffix = '.missing_pgx_var'
 
+# precompiled patterns (matched on every invocation, or per file/record on hot paths)
+_tool_version_pattern = re.compile(r'Version: (\d+(\.\d+)*)', re.MULTILINE)
+_java_version_pattern = re.compile(r'version "(\d+(\.\d+)*)"', re.MULTILINE)
+_vcf_file_pattern = re.compile(r'\.vcf(\.b?gz)?$', re.IGNORECASE)
+_gvcf_file_pattern = re.compile(r'\.(g|genomic)\.vcf(\.b?gz)?', re.IGNORECASE)
+_vcf_basename_pattern = re.compile(r'(.+?)((\.pgx_regions)|(\.normalized))*(\.vcf(\.b?gz)?|\.bcf)$', re.IGNORECASE)
+_max_memory_pattern = re.compile(r'^\d+[GgMm]$')
+
+# tracks whether bgzip has been validated (done lazily - see bgzip_file())
+_bgzip_validated = False
+
+# cross-invocation cache of tool versions, keyed by binary identity (see _tool_cache_key())
+_tool_version_cache_file: Path = Path(tempfile.gettempdir()) / '.pharmcat_tool_versions.json'
+
 
 def find_uniallelic_file(pharmcat_positions: Path, must_exist: bool = True) -> Path:
     uniallelic_positions_vcf: Path = pharmcat_positions.parent / common.UNIALLELIC_VCF_FILENAME
@@ -66,6 +87,47 @@ def run(command: List[str]):
             raise ReportableException('Error: Failed to run %s' % ' '.join(command))
 
 
+def run_pipeline(commands: List[List[str]], out_file: Optional[Path] = None):
+    """
+    Runs a chain of commands, piping each command's stdout into the next command's stdin.
+
+    Intermediate data never touches disk, so bcftools stages should pass uncompressed BCF
+    between them ("-Ou") and only the last command should pay for compression (either writing
+    to its own "-o" output or, if out_file is specified, to out_file via stdout).
+    """
+    processes: List[subprocess.Popen] = []
+    out_f = open(out_file, 'wb') if out_file else None
+    try:
+        prev_stdout = None
+        for index, command in enumerate(commands):
+            is_last = index == len(commands) - 1
+            try:
+                p = subprocess.Popen(command, stdin=prev_stdout,
+                                     stdout=out_f if is_last else subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+            except FileNotFoundError:
+                raise ReportableException('Error: %s not found' % command[0])
+            # close our copy of the pipe so upstream failures propagate
+            if prev_stdout is not None:
+                prev_stdout.close()
+            prev_stdout = p.stdout
+            processes.append(p)
+        for p, command in zip(processes, commands):
+            stderr = p.stderr.read()
+            p.stderr.close()
+            if p.wait() != 0:
+                if stderr:
+                    raise ReportableException(stderr.decode(errors='replace'))
+                else:
+                    raise ReportableException('Error: Failed to run %s' % ' '.join(command))
+    finally:
+        if out_f:
+            out_f.close()
+        for p in processes:
+            if p.poll() is None:
+                p.kill()
+
+
 def run_pharmcat(jar_location: Path, args: List[str], max_processes: int, max_memory: Optional[str] = None,
                  verbose: int = 0):
     command: List[str] = [common.JAVA_PATH, '-cp', str(jar_location.absolute())]
@@ -88,31 +150,82 @@ def run_pharmcat(jar_location: Path, args: List[str], max_processes: int, max_me
             raise ReportableException(e.stderr)
 
 
+def _tool_cache_key(tool_path: str) -> Optional[str]:
+    """
+    Builds a cache key that identifies a tool binary (resolved path + mtime + inode),
+    or None if the binary cannot be found.
+    """
+    resolved = shutil.which(tool_path)
+    if resolved is None:
+        return None
+    try:
+        stat_rez = os.stat(resolved)
+    except OSError:
+        return None
+    return '%s:%d:%d' % (resolved, stat_rez.st_mtime_ns, stat_rez.st_ino)
+
+
+def _read_cached_tool_version(cache_key: str) -> Optional[str]:
+    try:
+        with open(_tool_version_cache_file, 'r') as f:
+            return json.load(f).get(cache_key)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cached_tool_version(cache_key: str, tool_version: str):
+    cache = {}
+    try:
+        with open(_tool_version_cache_file, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        pass
+    cache[cache_key] = tool_version
+    try:
+        with tempfile.NamedTemporaryFile(mode='w', dir=_tool_version_cache_file.parent, delete=False) as tmp_f:
+            json.dump(cache, tmp_f)
+        # atomic replace, so concurrent pipeline workers never see a partial cache file
+        os.replace(tmp_f.name, _tool_version_cache_file)
+    except OSError:
+        # the cache is purely an optimization - never fail over it
+        pass
+
+
 def validate_tool(tool_name: str, tool_path: str, min_version: Optional[str] = None):
     """
     Validates that tool is available and meets minimum version requirement.
     Version checking only works for samtools tools, which has standardized version info in its help text.
 
+    Version lookups are cached in a temp file keyed by the binary's path/mtime/inode, so batch
+    workflows that invoke the preprocessor thousands of times skip the subprocess probe.
+
     :param tool_name: name of tool (used for error messages)
     :param tool_path: path to tool
     :param min_version: minimum version of tool
     :raises ReportableException if tool cannot be found or does not meet version requirement
     """
-    try:
-        help_message = subprocess.run([tool_path, '-h'], stdout=subprocess.PIPE, check=True, stderr=subprocess.PIPE,
-                                      universal_newlines=True).stdout
-    except FileNotFoundError:
-        raise ReportableException('Error: %s not found' % tool_path)
-    except subprocess.TimeoutExpired:
-        raise ReportableException('Error: %s took too long' % tool_path)
-    except subprocess.CalledProcessError as e:
-        raise ReportableException(e.stderr if e.stderr else 'Error: Failed to run %s' % tool_path)
+    cache_key = _tool_cache_key(tool_path)
+    tool_version = _read_cached_tool_version(cache_key) if cache_key else None
+    if tool_version is None:
+        try:
+            help_message = subprocess.run([tool_path, '-h'], stdout=subprocess.PIPE, check=True,
+                                          stderr=subprocess.PIPE, universal_newlines=True).stdout
+        except FileNotFoundError:
+            raise ReportableException('Error: %s not found' % tool_path)
+        except subprocess.TimeoutExpired:
+            raise ReportableException('Error: %s took too long' % tool_path)
+        except subprocess.CalledProcessError as e:
+            raise ReportableException(e.stderr if e.stderr else 'Error: Failed to run %s' % tool_path)
+
+        rez = _tool_version_pattern.search(str(help_message))
+        if rez is not None:
+            tool_version = rez.group(1)
+            if cache_key:
+                _write_cached_tool_version(cache_key, tool_version)
 
     if min_version is not None:
         # check that the minimum version requirement is met
-        rez = re.search(r'Version: (\d+(\.\d+)*)', str(help_message), re.MULTILINE)
-        if rez is not None:
-            tool_version = rez.group(1)
+        if tool_version is not None:
             if version.parse(tool_version) < version.parse(min_version):
                 raise ReportableException("Error: Please use %s %s or higher." % (tool_name, min_version))
         else:
@@ -156,6 +269,8 @@ def validate_bgzip(tool_path: Optional[str] = None, min_version: Optional[str] =
     bgzip_version = min_version if min_version else common.MIN_BGZIP_VERSION
     validate_tool('bgzip', bgzip_path, bgzip_version)
     common.BGZIP_PATH = bgzip_path
+    global _bgzip_validated
+    _bgzip_validated = True
 
 
 def validate_java(min_version: Optional[str] = None):
@@ -178,7 +293,7 @@ def validate_java(min_version: Optional[str] = None):
 
     if java_version is not None:
         # check that the minimum version requirement is met
-        rez = re.search(r'version "(\d+(\.\d+)*)"', str(version_message), re.MULTILINE)
+        rez = _java_version_pattern.search(str(version_message))
         if rez is not None:
             tool_version = rez.group(1)
             if version.parse(tool_version) < version.parse(java_version):
@@ -241,14 +356,15 @@ def find_vcf_files(vcf_dir: Path, verbose: int = 0) -> List[Path]:
     if verbose:
         print('Looking for VCF files in', str(vcf_dir.absolute()))
     vcf_dict: dict[str, List[str]] = {}
-    for f in vcf_dir.iterdir():
-        if f.is_file():
-            if is_vcf_file(f.name):
-                vcf_basename = get_vcf_basename(f.name)
+    # os.scandir avoids a stat syscall per entry, which adds up on network filesystems
+    for entry in os.scandir(vcf_dir):
+        if entry.is_file():
+            if is_vcf_file(entry.name):
+                vcf_basename = get_vcf_basename(entry.name)
                 if vcf_basename in vcf_dict:
-                    vcf_dict[vcf_basename].append(f.name)
+                    vcf_dict[vcf_basename].append(entry.name)
                 else:
-                    vcf_dict[vcf_basename] = [f.name]
+                    vcf_dict[vcf_basename] = [entry.name]
     prepped: List[str] = []
     for basename in vcf_dict.keys():
         if basename.endswith('.preprocessed'):
@@ -297,11 +413,11 @@ def find_file(filename: str, dirs: List[Path]) -> Optional[Path]:
 
 
 def is_vcf_file(file: Union[Path, str]):
-    return re.search('\\.vcf(\\.b?gz)?$', str(file)) is not None
+    return _vcf_file_pattern.search(str(file)) is not None
 
 
 def is_gvcf_file(file: Path):
-    return re.search('\\.(g|genomic)\\.vcf(\\.b?gz)?', str(file)) or _is_gvcf_file(file)
+    return _gvcf_file_pattern.search(str(file)) or _is_gvcf_file(file)
 
 
 def _is_gvcf_file(file: Path) -> bool:
@@ -322,7 +438,7 @@ def _check_for_gvcf(in_f) -> bool:
             line = line.rstrip('\n')
             fields: List[str] = line.split('\t')
             # check whether input is a block gVCF
-            if re.search('END', fields[7]):
+            if 'END' in fields[7]:
                 return True
     return False
 
@@ -335,7 +451,7 @@ def get_vcf_basename(path: Union[Path, str]) -> str:
     """
     if not isinstance(path, Path):
         path = Path(path)
-    match = re.search('(.+?)((\\.pgx_regions)|(\\.normalized))*\\.vcf(\\.b?gz)?$', path.name)
+    match = _vcf_basename_pattern.search(path.name)
     if not match:
         raise InappropriateVCFSuffix(path)
     return match.group(1)
@@ -357,12 +473,9 @@ def parse_samples(sample_string: str) -> List[str]:
 def read_sample_file(sample_file: Path, verbose: int = 0) -> List[str]:
     if verbose:
         print('Reading samples from', sample_file, '...')
-    samples: List[str] = []
-    with open(sample_file, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if line and not line.startswith("#"):
-                samples.append(line)
+    # read the file in one pass - sample files can list 100k+ samples for cohort runs
+    samples: List[str] = [line for line in (raw.strip() for raw in sample_file.read_text().splitlines())
+                          if line and not line.startswith("#")]
     if len(samples) == 0:
         # TODO(markwoon): use colorama to highlight this in next release
         print("Warning: No samples found. Will use all samples listed in VCF.")
@@ -375,15 +488,30 @@ def read_vcf_samples(vcf_file: Path, verbose: int = 0) -> List[str]:
     """
     Obtain a list of samples from the input VCF.
 
-    "bcftools query <options> <input_vcf>". For bcftools common options, see running_bcftools().
+    Uses cyvcf2 when available, which only parses the VCF header in-process.
+    Otherwise falls back to "bcftools query <options> <input_vcf>".
+    For bcftools common options, see running_bcftools().
     "-l" list sample names and exit.
     Samples are delimited by '\\\\n' and the last line ends as 'last_sample_ID\\\\n\\\\n'.
     """
 
     if verbose:
         print('Reading samples from', vcf_file, '...')
-    output = subprocess.check_output([common.BCFTOOLS_PATH, 'query', '-l', str(vcf_file)], universal_newlines=True)
-    vcf_sample_list: List[str] = output.split('\n')[:-1]  # remove the black line at the end
+    vcf_sample_list: List[str]
+    if _CyVCF is not None:
+        try:
+            vcf_sample_list = list(_CyVCF(str(vcf_file)).samples)
+        except OSError as e:
+            raise ReportableException('Error: Failed to read samples from %s (%s)' % (vcf_file, e))
+    else:
+        try:
+            output = subprocess.run([common.BCFTOOLS_PATH, 'query', '-l', str(vcf_file)],
+                                    check=True, capture_output=True, universal_newlines=True).stdout
+        except FileNotFoundError:
+            raise ReportableException('Error: %s not found' % common.BCFTOOLS_PATH)
+        except subprocess.CalledProcessError as e:
+            raise ReportableException(e.stderr if e.stderr else 'Error: Failed to read samples from %s' % vcf_file)
+        vcf_sample_list = output.splitlines()
     if len(vcf_sample_list) == 0:
         raise ReportableException('Error: No samples found in VCF.')
     validate_samples(vcf_sample_list)
@@ -398,14 +526,37 @@ def is_gz_file(file: Path):
         return test_f.read(2) == b'\x1f\x8b'
 
 
-def bgzip_file(file: Path, verbose: int = 0):
+def is_bgzf_file(file: Path):
+    """
+    Checks whether a file is blocked gzip (BGZF) compressed, as opposed to plain gzip.
+    BGZF files carry a 'BC' extra subfield in the gzip header (see the BGZF section of the SAM spec).
+    """
+    with open(file, 'rb') as test_f:
+        header = test_f.read(18)
+    return len(header) == 18 and header[0:4] == b'\x1f\x8b\x08\x04' and header[12:14] == b'BC'
+
+
+def bgzip_file(file: Path, verbose: int = 0, threads: int = 1, level: Optional[int] = None):
     """
     bgzip the specified file.
     Will overwrite existing .gz/.bgz file.
+
+    "-@" parallelizes the deflate work across threads.
+    "-l" sets the compression level (bgzip's default when not specified).
     """
+    # bgzip is only needed for plain-text inputs (bcftools handles compressed I/O itself),
+    # so validate it on first use rather than on every invocation
+    if not _bgzip_validated:
+        validate_bgzip()
     if verbose:
         print('  * Bgzipping', file)
-    run([common.BGZIP_PATH, '-f', str(file)])
+    bgzip_command = [common.BGZIP_PATH, '-f']
+    if threads > 1:
+        bgzip_command.extend(['-@', str(threads)])
+    if level is not None:
+        bgzip_command.extend(['-l', str(level)])
+    bgzip_command.append(str(file))
+    run(bgzip_command)
     # make sure it worked
     gz_path: Path = Path(str(file) + '.gz')
     if not gz_path.exists():
@@ -419,29 +570,57 @@ def bgzip_file(file: Path, verbose: int = 0):
     return bgz_path
 
 
-def bgzip_vcf(file: Path, verbose: int = 0) -> Path:
+def bgzip_vcf(file: Path, verbose: int = 0, threads: int = 1, level: Optional[int] = None) -> Path:
     """
-    Make sure file is bgzipped.
+    Make sure file is bgzipped (BGZF, not just gzip).
     Will overwrite existing .gz/.bgz file.
     Will delete pre-existing .bgz indices.
     """
     if is_gz_file(file):
-        return file
-    file = bgzip_file(file, verbose)
+        if is_bgzf_file(file):
+            return file
+        # plain gzip: bcftools cannot index it, so convert now instead of failing downstream
+        file = _recompress_gzip_to_bgzf(file, verbose)
+    else:
+        file = bgzip_file(file, verbose, threads=threads, level=level)
     delete_index(file, '.tbi', verbose=verbose)
     delete_index(file, '.csi', verbose=verbose)
     return file
 
 
+def _recompress_gzip_to_bgzf(file: Path, verbose: int = 0) -> Path:
+    """
+    Converts a plain gzip compressed file to BGZF.
+
+    The bytes are streamed through a pipe ("gunzip -c | bgzip -c") so the uncompressed data
+    (typically several times the compressed size) never touches disk.
+    """
+    if not _bgzip_validated:
+        validate_bgzip()
+    if verbose:
+        print('  * Converting plain gzip to bgzip:', file)
+    tmp_file = Path(str(file) + '.tmp')
+    run_pipeline([['gunzip', '-c', str(file)], [common.BGZIP_PATH, '-c']], out_file=tmp_file)
+    if file.suffix in ('.gz', '.bgz'):
+        bgz_path: Path = file.with_suffix('.bgz')
+    else:
+        bgz_path = Path(str(file) + '.bgz')
+    file.unlink()
+    # must delete existing because won't overwrite on Windows
+    bgz_path.unlink(missing_ok=True)
+    # use shutil.move instead of rename to deal with cross-device issues
+    shutil.move(tmp_file, bgz_path)
+    return bgz_path
+
+
 def delete_index(vcf_file: Path, suffix: str, verbose: int = 0):
     index = Path(str(vcf_file) + suffix)
-    if index.exists():
-        if index.is_file():
-            if verbose >= 2:
-                print('  * Removing pre-existing %s index' % suffix)
-            index.unlink()
-        else:
-            raise ReportableException('Error: Cannot delete obsolete index.  %s is not a file' % index)
+    if index.is_file():
+        if verbose >= 2:
+            print('  * Removing pre-existing %s index' % suffix)
+        index.unlink()
+    elif index.exists():
+        raise ReportableException('Error: Cannot delete obsolete index.  %s is not a file' % index)
 
 
 def find_index_file(vcf_file: Path) -> Optional[Path]:
@@ -474,10 +653,23 @@ def delete_vcf_and_index(vcf_file: Path, verbose: int = 0):
     delete_index(vcf_file, '.csi', verbose)
 
 
+def delete_vcfs_and_indexes(vcf_files: List[Path], verbose: int = 0):
+    """
+    Delete the specified VCF files and their index files in a single burst.
+    Skips the per-file existence checks (one stat plus one unlink per path) that
+    delete_vcf_and_index() incurs, which adds up on slow cluster filesystems.
+    """
+    for vcf_file in vcf_files:
+        if verbose >= 2:
+            print('  * Removing %s and indexes' % vcf_file)
+        for path in (vcf_file, Path(str(vcf_file) + '.csi'), Path(str(vcf_file) + '.tbi')):
+            path.unlink(missing_ok=True)
+
+
 def download_from_url(url: str, download_dir: Path, force_update: bool = False, verbose: int = 0):
     """Download from a URL."""
 
-    remote_basename = os.path.basename(urllib.parse.urlparse(url).path)
+    remote_basename = Path(urllib.parse.urlparse(url).path).name
     if remote_basename:
         dl_file = download_dir / remote_basename
         if dl_file.exists():
@@ -530,7 +722,7 @@ def download_reference_fasta_and_index(download_dir: Union[Path, str], force_upd
                                  download_dir, force_update, verbose)
     with tarfile.open(tar_file, 'r') as tar:
         tar.extractall(path=download_dir)
-    os.remove(tar_file)
+    tar_file.unlink()
 
     return ref_file
 
@@ -624,10 +816,13 @@ def extract_pgx_regions(pharmcat_positions: Path, vcf_files: List[Path], samples
                         concurrent_mode: bool = False, max_processes: int = 1,
                         verbose: int = 0) -> Path:
     """
-    Extracts PGx regions from input VCF file(s) into a single VCF file and rename chromosomes to match PharmCAT
+    Extracts PGx regions from input VCF file(s) into a single BCF file and rename chromosomes to match PharmCAT
     expectations.
 
-    :return: compressed VCF file that only contains positions of interest
+    Intermediate extracts are held as BCF so that downstream bcftools stages can read them
+    without the text VCF parse/serialize overhead.
+
+    :return: compressed BCF file that only contains positions of interest
     """
 
     with tempfile.TemporaryDirectory() as td:
@@ -638,10 +833,14 @@ def extract_pgx_regions(pharmcat_positions: Path, vcf_files: List[Path], samples
             for sample in samples:
                 w.write('%s\n' % sample)
 
-        pgx_region_vcf_file: Path = output_dir / (output_basename + '.pgx_regions.vcf.bgz')
+        # obtain the PGx regions to be extracted once, up front, so concurrent workers
+        # do not each re-parse the reference PGx positions VCF
+        ref_pgx_regions: pd.DataFrame = _get_ref_pgx_regions(pharmcat_positions)
+
+        pgx_region_vcf_file: Path = output_dir / (output_basename + '.pgx_regions.bcf')
         if len(vcf_files) == 1:
             # this should create pgx_region_vcf_file
-            _extract_pgx_regions(pharmcat_positions, vcf_files[0], tmp_sample_file, output_dir, output_basename,
+            _extract_pgx_regions(ref_pgx_regions, vcf_files[0], tmp_sample_file, output_dir, output_basename,
                                  verbose)
         else:
             # generate files to be concatenated
@@ -651,14 +850,14 @@ def extract_pgx_regions(pharmcat_positions: Path, vcf_files: List[Path], samples
                                                                                             validate=False)) as e:
                     futures = []
                     for vcf_file in vcf_files:
-                        futures.append(e.submit(_extract_pgx_regions, pharmcat_positions, vcf_file, tmp_sample_file,
+                        futures.append(e.submit(_extract_pgx_regions, ref_pgx_regions, vcf_file, tmp_sample_file,
                                                 output_dir, get_vcf_basename(vcf_file), verbose))
                     concurrent.futures.wait(futures, return_when=ALL_COMPLETED)
                     for future in futures:
                         tmp_files.append(future.result())
             else:
                 for vcf_file in vcf_files:
-                    tmp_files.append(_extract_pgx_regions(pharmcat_positions, vcf_file, tmp_sample_file, output_dir,
+                    tmp_files.append(_extract_pgx_regions(ref_pgx_regions, vcf_file, tmp_sample_file, output_dir,
                                                           get_vcf_basename(vcf_file), verbose))
             # write file names to txt file for bcftools
             tmp_file_list = tmp_dir / 'regions.txt'
@@ -669,8 +868,10 @@ def extract_pgx_regions(pharmcat_positions: Path, vcf_files: List[Path], samples
             # concatenate vcfs
             if verbose:
                 print('Concatenating PGx VCFs')
-            bcftools_command = [common.BCFTOOLS_PATH, 'concat', '--no-version', '-a', '-f', str(tmp_file_list), '-Oz',
+            bcftools_command = [common.BCFTOOLS_PATH, 'concat', '--no-version', '-a', '-f', str(tmp_file_list), '-Ob1',
                                 '-o', str(pgx_region_vcf_file)]
+            if max_processes > 1:
+                bcftools_command.extend(['--threads', str(max_processes)])
             run(bcftools_command)
             # index the VCF file
             index_vcf(pgx_region_vcf_file, verbose)
@@ -678,7 +879,20 @@ def extract_pgx_regions(pharmcat_positions: Path, vcf_files: List[Path], samples
         return pgx_region_vcf_file
 
 
-def _extract_pgx_regions(pharmcat_positions: Path, vcf_file: Path, sample_file: Path, output_dir: Path,
+def _get_ref_pgx_regions(pharmcat_positions: Path) -> pd.DataFrame:
+    """
+    Obtains the PGx regions covered by the reference PGx positions VCF, one region per chromosome.
+    """
+    df_ref_pgx_pos = allel.vcf_to_dataframe(str(pharmcat_positions))
+    df_ref_pgx_pos['CHROM'] = df_ref_pgx_pos['CHROM'].astype('category').cat.set_categories(_chr_valid_sorter)
+    ref_pgx_regions = df_ref_pgx_pos.groupby(['CHROM'], observed=True)['POS'].agg(_get_vcf_pos_min_max).reset_index()
+    # add a special case for 'chrMT'
+    idx_chr_m = ref_pgx_regions.index[ref_pgx_regions['CHROM'] == 'chrM']
+    ref_pgx_regions = pd.concat([ref_pgx_regions, ref_pgx_regions.loc[idx_chr_m].assign(**{'CHROM': 'chrMT'})])
+    return ref_pgx_regions
+
+
+def _extract_pgx_regions(ref_pgx_regions: pd.DataFrame, vcf_file: Path, sample_file: Path, output_dir: Path,
                          output_basename: Optional[str], verbose: int = 0) -> Path:
     """
     Does the actual work to extract PGx regions from input VCF file(s) into a single VCF file and
@@ -694,14 +908,6 @@ def _extract_pgx_regions(pharmcat_positions: Path, vcf_file: Path, sample_file:
     if idx_file is None:
         index_vcf(bgz_file, verbose)
 
-    # obtain PGx regions to be extracted
-    df_ref_pgx_pos = allel.vcf_to_dataframe(str(pharmcat_positions))
-    df_ref_pgx_pos['CHROM'] = df_ref_pgx_pos['CHROM'].astype('category').cat.set_categories(_chr_valid_sorter)
-    ref_pgx_regions = df_ref_pgx_pos.groupby(['CHROM'], observed=True)['POS'].agg(_get_vcf_pos_min_max).reset_index()
-    # add a special case for 'chrMT'
-    idx_chr_m = ref_pgx_regions.index[ref_pgx_regions['CHROM'] == 'chrM']
-    ref_pgx_regions = pd.concat([ref_pgx_regions, ref_pgx_regions.loc[idx_chr_m].assign(**{'CHROM': 'chrMT'})])
-
     # validate chromosome formats
     if _is_valid_chr(bgz_file):
         # format the pgx regions to be extracted
@@ -714,10 +920,11 @@ def _extract_pgx_regions(pharmcat_positions: Path, vcf_file: Path, sample_file:
     # extract pgx regions and modify chromosome names if necessary
     if output_basename is None:
         output_basename = get_vcf_basename(vcf_file)
-    pgx_regions_vcf = output_dir / (output_basename + '.pgx_regions.vcf.bgz')
+    pgx_regions_vcf = output_dir / (output_basename + '.pgx_regions.bcf')
+    # intermediate files are short-lived, so keep them as BCF at the cheapest compression level (-Ob1)
     bcftools_command = [common.BCFTOOLS_PATH, 'annotate', '--no-version', '-S', str(sample_file),
                         '--rename-chrs', str(common.CHR_RENAME_FILE), '-r', ref_pgx_regions, '-i', 'ALT="."', '-k',
-                        '-Oz', '-o', str(pgx_regions_vcf), str(bgz_file)]
+                        '-Ob1', '-o', str(pgx_regions_vcf), str(bgz_file)]
     if verbose:
         print('* Extracting PGx regions and normalizing chromosome names')
     run(bcftools_command)
@@ -727,7 +934,7 @@ def _extract_pgx_regions(pharmcat_positions: Path, vcf_file: Path, sample_file:
 
 
 def normalize_vcf(reference_genome: Path, vcf_file: Path, output_dir: Path, output_basename: Optional[str],
-                  verbose: int = 0):
+                  max_processes: int = 1, verbose: int = 0):
     """
     Normalize the input VCF against the human reference genome sequence GRCh38/hg38.
 
@@ -737,13 +944,16 @@ def normalize_vcf(reference_genome: Path, vcf_file: Path, output_dir: Path, outp
     "-f <reference_genome_fasta>" reference sequence. Supplying this option turns on left-alignment and normalization.
     "-c ws" when incorrect or missing REF allele is encountered, warn (w) and set/fix(s) bad sites.  's' will swap
     alleles and update GT and AC counts. Importantly, 's' will NOT fix strand issues in a VCF.
+    "--threads" parallelizes the BGZF compression of the output.
     """
     if output_basename is None:
         output_basename = get_vcf_basename(vcf_file)
-    normalized_vcf = output_dir / (output_basename + '.normalized.vcf.bgz')
+    normalized_vcf = output_dir / (output_basename + '.normalized.bcf')
     bcftools_command = [common.BCFTOOLS_PATH, 'norm', '--no-version', '-m-', '-c', 'ws',
-                        '-Oz', '-o', str(normalized_vcf),
+                        '-Ob1', '-o', str(normalized_vcf),
                         '-f', str(reference_genome), str(vcf_file)]
+    if max_processes > 1:
+        bcftools_command.extend(['--threads', str(max_processes)])
     if verbose:
         print('* Normalizing VCF')
     run(bcftools_command)
@@ -765,7 +975,7 @@ def _is_phased(gt_field) -> bool:
 
 def extract_pgx_variants(pharmcat_positions: Path, reference_fasta: Path, vcf_file: Path,
                          output_dir: Path, output_basename: str, missing_to_ref: bool = False,
-                         verbose: int = 0) -> Path:
+                         max_processes: int = 1, verbose: int = 0) -> Path:
     """
     Extract specific pgx positions that are present in the reference PGx VCF.
     Generate a report of PGx positions that are missing in the input VCF.
@@ -787,7 +997,7 @@ def extract_pgx_variants(pharmcat_positions: Path, reference_fasta: Path, vcf_fi
         pgx_pos_only_bgz: Path = tmp_dir / (output_basename + '.pgx_pos_only.vcf.bgz')
         if verbose:
             print('  * Retaining PGx positions, regardless of alleles')
-        run([common.BCFTOOLS_PATH, 'view', '--no-version', '-T', str(uniallelic_positions_vcf), '-Oz',
+        run([common.BCFTOOLS_PATH, 'view', '--no-version', '-T', str(uniallelic_positions_vcf), '-Oz1',
              '-o', str(pgx_pos_only_bgz), str(vcf_file)])
         index_vcf(pgx_pos_only_bgz, verbose)
 
@@ -859,7 +1069,7 @@ def extract_pgx_variants(pharmcat_positions: Path, reference_fasta: Path, vcf_fi
 
                         # check whether input is a block gVCF
                         # this is a backup check - it should already have been checked earlier
-                        if re.search('END', fields[7]):
+                        if 'END' in fields[7]:
                             raise ReportableException('gVCF is not supported')
 
                         # match chromosome positions
@@ -1018,20 +1228,22 @@ def extract_pgx_variants(pharmcat_positions: Path, reference_fasta: Path, vcf_fi
                     else:
                         continue
 
-        # sort vcf
+        # sort vcf and make sure output complies with the multi-allelic format
+        # pipe the sorted output straight into "bcftools norm" as uncompressed BCF
+        # so the sorted intermediate is never compressed or written to disk
         if verbose:
-            print('* Sorting by chromosomal location...')
-        sorted_bgz: Path = tmp_dir / (output_basename + '.sorted.vcf.bgz')
-        bcftools_command = [common.BCFTOOLS_PATH, 'sort', '-Oz', '-o', str(sorted_bgz), str(updated_pgx_pos_vcf)]
-        run(bcftools_command)
-        index_vcf(sorted_bgz, verbose)
-
-        # make sure output complies with the multi-allelic format
-        if verbose:
-            print('* Enforcing multi-allelic variant representation...')
+            print('* Sorting by chromosomal location and enforcing multi-allelic variant representation...')
         normed_bgz: Path = tmp_dir / (output_basename + '.normed.vcf.bgz')
-        run([common.BCFTOOLS_PATH, 'norm', '--no-version', '-m+', '-c', 'ws', '-f', str(reference_fasta), '-Oz',
-             '-o', str(normed_bgz), str(sorted_bgz)])
+        # this usually becomes the long-lived PharmCAT-ready output, so compress it hard (-Oz9)
+        # with threaded deflate
+        norm_command = [common.BCFTOOLS_PATH, 'norm', '--no-version', '-m+', '-c', 'ws',
+                        '-f', str(reference_fasta), '-Oz9', '-o', str(normed_bgz), '-']
+        if max_processes > 1:
+            norm_command.extend(['--threads', str(max_processes)])
+        run_pipeline([
+            [common.BCFTOOLS_PATH, 'sort', '-Ou', str(updated_pgx_pos_vcf)],
+            norm_command,
+        ])
 
         filtered_bgz: Path = output_dir / (output_basename + '.multiallelic.vcf.bgz')
 
@@ -1075,7 +1287,7 @@ def extract_pgx_variants(pharmcat_positions: Path, reference_fasta: Path, vcf_fi
                         out_f.write(non_pgx_records[0] + '\n')
                         non_pgx_records.pop(0)
             # bgzip
-            bgzip_vcf(filtered_vcf, verbose)
+            bgzip_vcf(filtered_vcf, verbose, threads=max_processes, level=9)
         else:
             # use shutil.move instead of rename to deal with cross-device issues
             shutil.move(normed_bgz, filtered_bgz)
@@ -1115,52 +1327,51 @@ def _print_missing_positions(pharmcat_positions: Path, ref_pos_dynamic, output_d
     return missing_pos_file
 
 
-def _export_single_sample(vcf_file: Path, output_dir: Path, output_basename: str, sample: str,
-                          multisample: bool) -> Path:
+def _single_sample_filename(output_basename: str, sample: str, multisample: bool) -> str:
     """
-    Create final PharmCAT-ready VCF file.
-
-    "bcftools view <options> <input_vcf>". For bcftools common options, see running_bcftools().
-    "--force-samples" only warn about unknown subset samples
+    Builds the output file name (without extension) for a single-sample PharmCAT-ready VCF.
     """
     if output_basename:
         if multisample:
-            output_file_name = output_dir / (output_basename + '.' + sample + '.preprocessed.vcf')
+            return output_basename + '.' + sample + '.preprocessed'
         else:
-            output_file_name = output_dir / (output_basename + '.preprocessed.vcf')
+            return output_basename + '.preprocessed'
     else:
-        output_file_name = output_dir / (sample + '.preprocessed.vcf')
-
-    print('Generating PharmCAT-ready VCF for', sample)
-    tmp_file: Path = output_file_name.parent / ('tmp.' + sample + '.vcf')
-    run([common.BCFTOOLS_PATH, 'view', '--no-version', '-s', sample, '-Ov',
-         '-o', str(tmp_file), str(vcf_file)])
-    run([common.BCFTOOLS_PATH, 'annotate', '--no-version', '-x', '^INFO/PX', '-s', sample, '-Ov',
-         '-o', str(output_file_name), str(tmp_file)])
-    tmp_file.unlink()
-    return output_file_name
+        return sample + '.preprocessed'
 
 
 def export_single_sample_vcf(vcf_file: Path, samples: List[str], output_dir: Path, output_basename: str,
                              concurrent_mode: bool = False, max_processes: int = 1) -> List[Path]:
     """
     Write final PharmCAT-ready VCF for each sample.
+
+    Uses the "bcftools +split" plugin, which writes all per-sample files in a single pass over
+    the input instead of one "bcftools view -s <sample>" pass per sample, so the cost is
+    O(variants) rather than O(samples x variants).  As a result, concurrent_mode/max_processes
+    are no longer used here; they are kept for backwards compatibility.
+
+    "-S <file>" selects the samples to split out; the third column maps each sample to its
+    output file name (the plugin adds the extension).
     """
     is_multisample = len(samples) > 1
     results: List[Path] = []
-    if concurrent_mode:
-        with concurrent.futures.ProcessPoolExecutor(max_workers=check_max_processes(max_processes, validate=False))\
-                as executor:
-            futures = []
+    print('Generating PharmCAT-ready VCFs for %d sample(s)' % len(samples))
+    with tempfile.TemporaryDirectory() as td:
+        tmp_dir = Path(td)
+        # strip all INFO fields except PX once, before splitting
+        px_only_bcf: Path = tmp_dir / 'px_only.bcf'
+        run([common.BCFTOOLS_PATH, 'annotate', '--no-version', '-x', '^INFO/PX', '-Ob1',
+             '-o', str(px_only_bcf), str(vcf_file)])
+
+        split_samples_file: Path = tmp_dir / 'split_samples.txt'
+        with open(split_samples_file, 'w+') as w:
             for sample in samples:
-                futures.append(executor.submit(_export_single_sample, vcf_file, output_dir, output_basename,
-                                               sample, is_multisample))
-            concurrent.futures.wait(futures, return_when=ALL_COMPLETED)
-            for f in concurrent.futures.as_completed(futures):
-                results.append(f.result())
-    else:
-        for sample in samples:
-            results.append(_export_single_sample(vcf_file, output_dir, output_basename, sample, is_multisample))
+                file_name = _single_sample_filename(output_basename, sample, is_multisample)
+                w.write('%s\t%s\t%s\n' % (sample, sample, file_name))
+                results.append(output_dir / (file_name + '.vcf'))
+
+        run([common.BCFTOOLS_PATH, '+split', '-S', str(split_samples_file), '-Ov', '-o', str(output_dir),
+             str(px_only_bcf)])
     return results
 
 
@@ -1211,6 +1422,6 @@ def check_max_memory(requested_max_memory: Optional[str]) -> Optional[str]:
         else:
             return None
 
-    if not re.match('^\\d+[GgMm]$', max_memory):
+    if not _max_memory_pattern.match(max_memory):
         raise ReportableException("Max memory value is not in expected format: " + max_memory)
     return max_memory
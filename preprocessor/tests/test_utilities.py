@@ -1,3 +1,4 @@
+import gzip
 import os
 import shutil
 import tempfile
@@ -140,7 +141,8 @@ def test_is_vcf_file():
     valid_paths = [
         Path('/this/dir/file.vcf'),
         Path('/this/dir/file.vcf.bgz'),
-        Path('/this/dir/file.vcf.gz')
+        Path('/this/dir/file.vcf.gz'),
+        Path('/this/dir/file.VCF.GZ')
     ]
     for p in valid_paths:
         assert utils.is_vcf_file(p), str(p)
@@ -203,7 +205,9 @@ def test_get_vcf_basename():
         Path('/this/dir/file.vcf.gz'),
         Path('/this/dir/file.pgx_regions.vcf.gz'),
         Path('/this/dir/file.normalized.vcf.gz'),
-        Path('/this/dir/file.pgx_regions.normalized.vcf.gz')
+        Path('/this/dir/file.pgx_regions.normalized.vcf.gz'),
+        Path('/this/dir/file.pgx_regions.bcf'),
+        Path('/this/dir/file.normalized.bcf')
     ]
     for p in valid_paths:
         assert 'file' == utils.get_vcf_basename(p), str(p)
@@ -252,6 +256,32 @@ def test_is_gz_file():
     assert not utils.is_gz_file(helpers.test_dir / 'raw.Sample_1.preprocessed.vcf')
 
 
+def _make_plain_gzip(src: Path, gz_file: Path):
+    with open(src, 'rb') as in_f:
+        with gzip.open(gz_file, 'wb') as out_f:
+            shutil.copyfileobj(in_f, out_f)
+
+
+def test_is_bgzf_file():
+    assert utils.is_bgzf_file(helpers.test_dir / 'raw.vcf.bgz')
+    assert not utils.is_bgzf_file(helpers.test_dir / 'raw.Sample_1.preprocessed.vcf')
+
+    with tempfile.TemporaryDirectory() as td:
+        gz_file = Path(td) / 'raw.vcf.gz'
+        _make_plain_gzip(helpers.test_dir / 'raw.vcf', gz_file)
+        assert utils.is_gz_file(gz_file)
+        assert not utils.is_bgzf_file(gz_file)
+
+
+def test_bgzip_vcf_plain_gzip():
+    with tempfile.TemporaryDirectory() as td:
+        gz_file = Path(td) / 'raw.vcf.gz'
+        _make_plain_gzip(helpers.test_dir / 'raw.vcf', gz_file)
+        bgz_file = utils.bgzip_vcf(gz_file, True)
+        assert bgz_file.name == 'raw.vcf.bgz'
+        assert utils.is_bgzf_file(bgz_file)
+
+
 def test_bgzip_file():
     with tempfile.TemporaryDirectory() as td:
         tmp_file = Path(td, 'foo.txt')